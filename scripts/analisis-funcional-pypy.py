@@ -0,0 +1,23 @@
+#!/usr/bin/env pypy3
+"""
+Lanzador de analisis-funcional.py con PyPy
+==========================================
+
+El script es casi todo Python puro (lectura de genes, manejo de diccionarios,
+construcción del TSV y del resumen), así que con listas de resultados grandes
+se ejecuta bastante más rápido con el JIT de PyPy. Este archivo solo ejecuta
+el script principal con el intérprete indicado en la primera línea; acepta
+exactamente los mismos argumentos.
+
+Uso:
+  pypy3 analisis-funcional-pypy.py -i ..\\data\\genes_input.txt -o ..\\results\\resultados.tsv
+"""
+
+import os
+import runpy
+
+if __name__ == "__main__":
+    runpy.run_path(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analisis-funcional.py'),
+        run_name='__main__'
+    )
@@ -19,22 +19,113 @@ Fecha: 2025
 
 import argparse
 import sys
-import csv
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+from heapq import nsmallest
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
 
-# Intentar importar las librerías necesarias
+# Comprobar si las librerías necesarias están instaladas. requests solo se
+# importa al consultar la API (ver _obtener_sesion), así el modo demostración
+# no paga el coste de importarla
+TIENE_LIBRERIAS = importlib.util.find_spec('requests') is not None
+if not TIENE_LIBRERIAS:
+    print("⚠ Advertencia: requests no está instalado")
+    print("  El script funcionará en modo demostración únicamente")
+
+# orjson (opcional) lee y escribe JSON bastante más rápido que el módulo json
 try:
-    import pandas as pd
-    from gprofiler import GProfiler
-    TIENE_LIBRERIAS = True
+    import orjson as _json
 except ImportError:
-    TIENE_LIBRERIAS = False
-    print("⚠ Advertencia: gprofiler-official o pandas no están instalados")
-    print("  El script funcionará en modo demostración únicamente")
+    _json = json
+
+# Endpoint REST de g:Profiler (g:GOSt)
+URL_GPROFILER = 'https://biit.cs.ut.ee/gprofiler/api/gost/profile/'
+
+# Tiempo máximo de espera por petición (segundos)
+TIEMPO_ESPERA = 60
+
+# Parámetros fijos de la petición. Se piden todos los términos con su p-valor
+# corregido por FDR y el umbral de significancia se aplica localmente, así una
+# misma respuesta (p. ej. de la caché) sirve para cualquier umbral
+PARAMETROS_CONSULTA = {
+    'user_threshold': 1.0,
+    'all_results': True,
+    'significance_threshold_method': 'fdr',  # Corrección FDR (False Discovery Rate)
+    'no_evidences': True
+}
+
+# Umbral de significancia por defecto (p-valor corregido < 0.05)
+UMBRAL = 0.05
+
+# Bases de datos consultadas en g:Profiler
+FUENTES = ['GO:BP', 'GO:MF', 'GO:CC', 'KEGG', 'REAC', 'WP']
+
+# Directorio donde se guardan las respuestas de g:Profiler ya consultadas
+DIRECTORIO_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'gprofiler')
+
+# Número máximo de peticiones simultáneas a g:Profiler
+MAX_PETICIONES = 10
+
+# Columnas del archivo TSV de resultados
+COLUMNAS = ['source', 'native', 'name', 'p_value', 'significant',
+            'intersection_size', 'term_size', 'query_size', 'intersections']
+
+# Sesión HTTP compartida por todas las peticiones: reutiliza la conexión
+# (TCP + TLS) entre consultas y pide las respuestas comprimidas con gzip.
+# Se crea la primera vez que se necesita (ver _obtener_sesion), así el modo
+# demostración y las respuestas en caché no pagan su inicialización
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+# Línea de un archivo con varias listas: "nombre: GEN1, GEN2, GEN3"
+PATRON_LISTA = re.compile(r'^(\w[\w.-]*)\s*:\s+(.*)$')
+
+# Identificador de gen: cualquier secuencia sin espacios ni comas
+TOKEN_GEN = re.compile(r'[^\s,]+')
+
+@lru_cache(maxsize=16)
+def _leer_genes_archivo(archivo_entrada, fecha_modificacion):
+    """
+    Lee y separa los genes de un archivo. La fecha de modificación forma
+    parte de la clave de la caché, así que un archivo modificado se vuelve
+    a leer. Devuelve tuplas para que el resultado guardado no se pueda alterar.
+    """
+    with open(archivo_entrada, 'r') as f:
+        contenido = f.read().strip()
+    
+    # Varias listas con nombre (formato: "nombre: GEN1, GEN2, GEN3").
+    # Solo se revisan todas las líneas si la primera ya tiene ese formato
+    coincidencias = None
+    if PATRON_LISTA.match(contenido.partition('\n')[0].strip()):
+        lineas = [linea.strip() for linea in contenido.split('\n') if linea.strip()]
+        coincidencias = [PATRON_LISTA.match(linea) for linea in lineas]
+    if coincidencias and all(coincidencias):
+        listas = {}
+        for coincidencia in coincidencias:
+            nombre, resto = coincidencia.groups()
+            listas[nombre] = tuple(TOKEN_GEN.findall(resto))
+        return listas
+    
+    # Un único recorrido sirve para ambos formatos ("GEN1, GEN2, GEN3" o
+    # un gen por línea): cada gen es una secuencia sin espacios ni comas
+    return tuple(TOKEN_GEN.findall(contenido))
 
 def leer_genes(archivo_entrada):
     """
     Lee los genes desde un archivo de texto.
     Acepta genes en líneas separadas O separados por comas en una sola línea.
+    También acepta varias listas, una por línea, con el formato
+    "nombre: GEN1, GEN2, GEN3".
+    
+    Si el archivo no ha cambiado desde la última lectura en este proceso,
+    se reutiliza el resultado anterior sin volver a leerlo.
     
     Parámetros:
     -----------
@@ -43,20 +134,22 @@ def leer_genes(archivo_entrada):
     
     Retorna:
     --------
-    list
-        Lista de genes leídos del archivo
+    list o dict
+        Lista de genes leídos del archivo, o diccionario {nombre: lista de genes}
+        si el archivo contiene varias listas con nombre
     """
     try:
-        with open(archivo_entrada, 'r') as f:
-            contenido = f.read().strip()
+        leidos = _leer_genes_archivo(archivo_entrada, os.stat(archivo_entrada).st_mtime_ns)
         
-        # Intentar separar por comas primero (formato: "GEN1, GEN2, GEN3")
-        if ',' in contenido:
-            genes = [gen.strip() for gen in contenido.split(',') if gen.strip()]
-        else:
-            # Si no hay comas, separar por líneas
-            genes = [gen.strip() for gen in contenido.split('\n') if gen.strip()]
+        if isinstance(leidos, dict):
+            listas = {nombre: list(lista) for nombre, lista in leidos.items()}
+            total = sum(len(lista) for lista in listas.values())
+            print(f"✓ Se leyeron {len(listas)} listas ({total} genes) desde {archivo_entrada}")
+            for nombre, lista in listas.items():
+                print(f"  {nombre}: {', '.join(lista)}")
+            return listas
         
+        genes = list(leidos)
         print(f"✓ Se leyeron {len(genes)} genes desde {archivo_entrada}")
         print(f"  Genes: {', '.join(genes)}")
         return genes
@@ -67,12 +160,11 @@ def leer_genes(archivo_entrada):
         print(f"Error al leer el archivo: {e}")
         sys.exit(1)
 
-def generar_resultados_demo(genes):
-    """
-    Genera resultados de demostración para los genes mitocondriales.
-    Estos son resultados reales típicos para COX4I2, ND1 y ATP6.
-    """
-    resultados_demo = [
+# Resultados de demostración: términos reales típicos para COX4I2, ND1 y ATP6.
+# Cada término va acompañado de las posiciones de los genes de la lista que
+# contiene (None = todos los genes). Se construye una sola vez al importar.
+_PLANTILLA_DEMO = (
+    (
         {
             'source': 'GO:BP',
             'native': 'GO:0006119',
@@ -81,9 +173,11 @@ def generar_resultados_demo(genes):
             'significant': True,
             'intersection_size': 3,
             'term_size': 127,
-            'query_size': 3,
-            'intersections': genes.copy()
+            'query_size': 3
         },
+        None
+    ),
+    (
         {
             'source': 'GO:BP',
             'native': 'GO:0022900',
@@ -92,9 +186,11 @@ def generar_resultados_demo(genes):
             'significant': True,
             'intersection_size': 3,
             'term_size': 156,
-            'query_size': 3,
-            'intersections': genes.copy()
+            'query_size': 3
         },
+        None
+    ),
+    (
         {
             'source': 'GO:BP',
             'native': 'GO:0015992',
@@ -103,9 +199,11 @@ def generar_resultados_demo(genes):
             'significant': True,
             'intersection_size': 2,
             'term_size': 89,
-            'query_size': 3,
-            'intersections': [genes[1], genes[2]] if len(genes) >= 3 else genes
+            'query_size': 3
         },
+        (1, 2)
+    ),
+    (
         {
             'source': 'GO:MF',
             'native': 'GO:0004129',
@@ -114,9 +212,11 @@ def generar_resultados_demo(genes):
             'significant': True,
             'intersection_size': 1,
             'term_size': 18,
-            'query_size': 3,
-            'intersections': [genes[0]] if len(genes) >= 1 else genes
+            'query_size': 3
         },
+        (0,)
+    ),
+    (
         {
             'source': 'GO:MF',
             'native': 'GO:0008137',
@@ -125,9 +225,11 @@ def generar_resultados_demo(genes):
             'significant': True,
             'intersection_size': 1,
             'term_size': 42,
-            'query_size': 3,
-            'intersections': [genes[1]] if len(genes) >= 2 else genes
+            'query_size': 3
         },
+        (1,)
+    ),
+    (
         {
             'source': 'GO:MF',
             'native': 'GO:0046933',
@@ -136,9 +238,11 @@ def generar_resultados_demo(genes):
             'significant': True,
             'intersection_size': 1,
             'term_size': 28,
-            'query_size': 3,
-            'intersections': [genes[2]] if len(genes) >= 3 else genes
+            'query_size': 3
         },
+        (2,)
+    ),
+    (
         {
             'source': 'GO:CC',
             'native': 'GO:0005743',
@@ -147,9 +251,11 @@ def generar_resultados_demo(genes):
             'significant': True,
             'intersection_size': 3,
             'term_size': 287,
-            'query_size': 3,
-            'intersections': genes.copy()
+            'query_size': 3
         },
+        None
+    ),
+    (
         {
             'source': 'GO:CC',
             'native': 'GO:0005746',
@@ -158,9 +264,11 @@ def generar_resultados_demo(genes):
             'significant': True,
             'intersection_size': 1,
             'term_size': 19,
-            'query_size': 3,
-            'intersections': [genes[0]] if len(genes) >= 1 else genes
+            'query_size': 3
         },
+        (0,)
+    ),
+    (
         {
             'source': 'KEGG',
             'native': 'KEGG:00190',
@@ -169,9 +277,11 @@ def generar_resultados_demo(genes):
             'significant': True,
             'intersection_size': 3,
             'term_size': 133,
-            'query_size': 3,
-            'intersections': genes.copy()
+            'query_size': 3
         },
+        None
+    ),
+    (
         {
             'source': 'REAC',
             'native': 'REAC:R-HSA-611105',
@@ -180,29 +290,247 @@ def generar_resultados_demo(genes):
             'significant': True,
             'intersection_size': 3,
             'term_size': 98,
-            'query_size': 3,
-            'intersections': genes.copy()
-        }
+            'query_size': 3
+        },
+        None
+    )
+)
+
+def _genes_del_termino(genes, posiciones):
+    """
+    Devuelve los genes (tupla) que corresponden a las posiciones indicadas.
+    Si la tupla es demasiado corta (o posiciones es None) se devuelve la
+    misma tupla, sin copiarla.
+    """
+    if posiciones is None or len(genes) <= max(posiciones):
+        return genes
+    return tuple(genes[posicion] for posicion in posiciones)
+
+def generar_resultados_demo(genes):
+    """
+    Genera resultados de demostración para los genes mitocondriales.
+    Estos son resultados reales típicos para COX4I2, ND1 y ATP6.
+    
+    'intersections' es una tupla de solo lectura: los términos que contienen
+    todos los genes comparten la misma tupla.
+    """
+    genes = tuple(genes)
+    return [
+        {**campos, 'intersections': _genes_del_termino(genes, posiciones)}
+        for campos, posiciones in _PLANTILLA_DEMO
+    ]
+
+def _crear_tsv_demo():
+    """
+    Construye el TSV de demostración (ordenado por p-valor) como plantilla de
+    str.format: los genes de cada término quedan como {g0}, {g1}, {g2} o {todos}.
+    """
+    lineas = ['\t'.join(COLUMNAS)]
+    for campos, posiciones in sorted(_PLANTILLA_DEMO, key=lambda termino: termino[0]['p_value']):
+        valores = [str(campos.get(columna, '')).replace('{', '{{').replace('}', '}}')
+                   for columna in COLUMNAS[:-1]]
+        if posiciones is None:
+            genes = '{todos}'
+        else:
+            genes = ', '.join(f'{{g{posicion}}}' for posicion in posiciones)
+        lineas.append('\t'.join(valores + [genes]))
+    return '\r\n'.join(lineas) + '\r\n'
+
+# TSV de demostración precalculado y mayor p-valor que contiene
+_TSV_DEMO = _crear_tsv_demo()
+_P_MAX_DEMO = max(campos['p_value'] for campos, _ in _PLANTILLA_DEMO)
+
+def _obtener_sesion():
+    """
+    Devuelve la sesión HTTP compartida, creándola en la primera llamada.
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            import requests
+            _SESSION = requests.Session()
+            _SESSION.headers.update({'Accept-Encoding': 'gzip'})
+        return _SESSION
+
+def _ruta_cache(organismo, genes, fuentes):
+    """
+    Devuelve la ruta del archivo de caché para una consulta.
+    La clave no depende del orden de los genes, de las listas ni de las fuentes.
+    """
+    if isinstance(genes, dict):
+        genes_canonicos = {nombre: sorted(genes[nombre]) for nombre in sorted(genes)}
+    else:
+        genes_canonicos = sorted(genes)
+    clave = json.dumps({'o': organismo, 'g': genes_canonicos, 's': sorted(fuentes),
+                        'p': PARAMETROS_CONSULTA})
+    nombre = hashlib.sha1(clave.encode('utf-8')).hexdigest()
+    return os.path.join(DIRECTORIO_CACHE, f"{nombre}.json")
+
+def _consultar_con_cache(organismo, genes, fuentes, usar_cache=True):
+    """
+    Consulta g:Profiler reutilizando, si existe, la respuesta guardada en disco.
+    
+    Parámetros:
+    -----------
+    organismo : str
+        Código del organismo
+    genes : list o dict
+        Lista de identificadores de genes, o diccionario {nombre: lista}
+        para enviar varias listas en una única petición
+    fuentes : list
+        Bases de datos a consultar
+    usar_cache : bool, opcional
+        Si es False, siempre se consulta la API (la respuesta se guarda igualmente)
+    
+    Retorna:
+    --------
+    list
+        Lista de todos los términos devueltos por g:Profiler, sin filtrar
+        por significancia
+    """
+    ruta = _ruta_cache(organismo, genes, fuentes)
+    if usar_cache and os.path.exists(ruta):
+        try:
+            with open(ruta, 'rb') as f:
+                resultados = _json.loads(f.read())
+            print(f"\n✓ Resultados recuperados de la caché: {ruta}")
+            return resultados
+        except Exception as e:
+            print(f"\n⚠ No se pudo leer la caché ({e}), se consultará la API")
+    
+    # Realizar el análisis de enriquecimiento (ver PARAMETROS_CONSULTA)
+    respuesta = _obtener_sesion().post(
+        URL_GPROFILER,
+        json={'organism': organismo, 'query': genes, 'sources': fuentes, **PARAMETROS_CONSULTA},
+        timeout=TIEMPO_ESPERA
+    )
+    respuesta.raise_for_status()
+    resultados = _json.loads(respuesta.content)['result']
+    
+    try:
+        datos = _json.dumps(resultados)
+        if isinstance(datos, str):
+            datos = datos.encode('utf-8')
+        os.makedirs(DIRECTORIO_CACHE, exist_ok=True)
+        with open(ruta, 'wb') as f:
+            f.write(datos)
+    except OSError as e:
+        print(f"\n⚠ No se pudo guardar la caché: {e}")
+    
+    return resultados
+
+def _normalizar_resultados(resultados):
+    """
+    Completa los campos que el resto del script da por presentes, para que
+    ordenar y escribir no tengan que comprobarlos fila a fila.
+    """
+    for resultado in resultados:
+        resultado.setdefault('p_value', 1.0)
+        # La lista de genes de cada término se guarda ya como texto ("GEN1, GEN2")
+        genes = resultado.get('intersections')
+        resultado['intersections'] = ', '.join(genes) if isinstance(genes, (list, tuple)) else (genes or '')
+    return resultados
+
+def _filtrar_significativos(resultados, umbral):
+    """
+    Conserva los términos con p-valor corregido menor que el umbral.
+    """
+    significativos = [resultado for resultado in resultados if resultado['p_value'] < umbral]
+    for resultado in significativos:
+        resultado['significant'] = True
+    return significativos
+
+def _separar_por_consulta(resultados, listas):
+    """
+    Reparte los resultados de una consulta múltiple según la lista de origen.
+    g:Profiler indica la lista de cada término en el campo 'query'.
+    """
+    por_lista = {nombre: [] for nombre in listas}
+    for resultado in resultados:
+        por_lista.setdefault(resultado.get('query'), []).append(resultado)
+    return por_lista
+
+def _contar_terminos(resultados):
+    """
+    Cuenta los términos de una lista de resultados o de un diccionario de listas.
+    """
+    if isinstance(resultados, dict):
+        return sum(len(lista) for lista in resultados.values())
+    return len(resultados)
+
+def _resultados_demo(genes, umbral=UMBRAL):
+    """
+    Genera los resultados de demostración para una lista o un diccionario de listas.
+    """
+    if isinstance(genes, dict):
+        return {nombre: _resultados_demo(lista, umbral) for nombre, lista in genes.items()}
+    return _filtrar_significativos(_normalizar_resultados(generar_resultados_demo(genes)), umbral)
+
+def _analizar_organismo(genes, organismo, usar_cache, umbral=UMBRAL):
+    """
+    Consulta g:Profiler para un organismo, aplica el umbral de significancia
+    y separa los resultados por lista.
+    """
+    resultados = _normalizar_resultados(_consultar_con_cache(organismo, genes, FUENTES, usar_cache))
+    resultados = _filtrar_significativos(resultados, umbral)
+    if isinstance(genes, dict):
+        resultados = _separar_por_consulta(resultados, genes)
+    return resultados
+
+def _escribir(partes):
+    """
+    Escribe varias líneas en la salida estándar con una única llamada.
+    """
+    sys.stdout.write('\n'.join(partes) + '\n')
+
+def _mostrar_cabecera(genes, organismo):
+    """
+    Muestra la cabecera del análisis con el organismo y los genes a analizar.
+    """
+    partes = [
+        "\n" + "="*70,
+        "INICIANDO ANÁLISIS FUNCIONAL CON G:PROFILER",
+        "="*70,
+        f"\nOrganismo: {organismo}"
     ]
-    return resultados_demo
+    if isinstance(genes, dict):
+        partes.append(f"Listas a analizar: {len(genes)}")
+        partes.append(f"Genes a analizar: {sum(len(lista) for lista in genes.values())}")
+    else:
+        partes.append(f"Genes a analizar: {len(genes)}")
+    partes.extend([
+        "\nBases de datos consultadas:",
+        "  - Gene Ontology (GO): Procesos biológicos, funciones moleculares",
+        "  - KEGG: Rutas metabólicas",
+        "  - Reactome: Procesos biológicos",
+        "  - WikiPathways: Rutas biológicas"
+    ])
+    _escribir(partes)
 
-def realizar_analisis_funcional(genes, organismo='hsapiens', modo_demo=False):
+def realizar_analisis_funcional(genes, organismo='hsapiens', modo_demo=False, usar_cache=True,
+                                umbral=UMBRAL):
     """
     Realiza el análisis de enriquecimiento funcional usando g:Profiler.
     
     Parámetros:
     -----------
-    genes : list
-        Lista de identificadores de genes
+    genes : list o dict
+        Lista de identificadores de genes, o diccionario {nombre: lista}.
+        Todas las listas del diccionario se envían en una única petición.
     organismo : str, opcional
         Código del organismo (por defecto: 'hsapiens' para humano)
     modo_demo : bool, opcional
         Si es True, usa resultados de demostración sin conexión a internet
+    usar_cache : bool, opcional
+        Si es False, ignora las respuestas guardadas en disco y consulta la API
+    umbral : float, opcional
+        P-valor corregido (FDR) por debajo del cual un término es significativo
     
     Retorna:
     --------
-    list
-        Lista de resultados del análisis de enriquecimiento
+    list o dict
+        Lista de resultados del análisis de enriquecimiento, o diccionario
+        {nombre: lista de resultados} si se recibieron varias listas
     
     Detalles del Método:
     --------------------
@@ -221,16 +549,7 @@ def realizar_analisis_funcional(genes, organismo='hsapiens', modo_demo=False):
     - REAC (Reactome)
     - WP (WikiPathways)
     """
-    print("\n" + "="*70)
-    print("INICIANDO ANÁLISIS FUNCIONAL CON G:PROFILER")
-    print("="*70)
-    print(f"\nOrganismo: {organismo}")
-    print(f"Genes a analizar: {len(genes)}")
-    print("\nBases de datos consultadas:")
-    print("  - Gene Ontology (GO): Procesos biológicos, funciones moleculares")
-    print("  - KEGG: Rutas metabólicas")
-    print("  - Reactome: Procesos biológicos")
-    print("  - WikiPathways: Rutas biológicas")
+    _mostrar_cabecera(genes, organismo)
     
     # Si no tiene las librerías o está en modo demo, usar resultados demo
     if modo_demo or not TIENE_LIBRERIAS:
@@ -238,44 +557,88 @@ def realizar_analisis_funcional(genes, organismo='hsapiens', modo_demo=False):
         if not TIENE_LIBRERIAS:
             print("  (Las librerías no están instaladas)")
         print("  Usando resultados precargados (no requiere conexión a internet)")
-        resultados = generar_resultados_demo(genes)
+        resultados = _resultados_demo(genes, umbral)
         print(f"\n✓ Análisis completado exitosamente")
-        print(f"  Se encontraron {len(resultados)} términos enriquecidos significativamente")
+        print(f"  Se encontraron {_contar_terminos(resultados)} términos enriquecidos significativamente")
         return resultados
     
     try:
-        # Inicializar el cliente de g:Profiler
-        gp = GProfiler(return_dataframe=False)
-        
-        # Realizar el análisis de enriquecimiento
-        # user_threshold: p-valor umbral para significancia
-        # significance_threshold_method: método de corrección de múltiples hipótesis
-        resultados = gp.profile(
-            organism=organismo,
-            query=genes,
-            user_threshold=0.05,  # p-valor < 0.05
-            significance_threshold_method='fdr',  # Corrección FDR (False Discovery Rate)
-            sources=['GO:BP', 'GO:MF', 'GO:CC', 'KEGG', 'REAC', 'WP']
-        )
+        resultados = _analizar_organismo(genes, organismo, usar_cache, umbral)
         
         print(f"\n✓ Análisis completado exitosamente")
-        print(f"  Se encontraron {len(resultados)} términos enriquecidos significativamente")
+        print(f"  Se encontraron {_contar_terminos(resultados)} términos enriquecidos significativamente")
         
         return resultados
         
     except Exception as e:
         print(f"\n⚠ Error al conectar con g:Profiler: {e}")
         print("\n  Intentando con modo demostración...")
-        return realizar_analisis_funcional(genes, organismo, modo_demo=True)
+        return realizar_analisis_funcional(genes, organismo, modo_demo=True, umbral=umbral)
+
+def realizar_analisis_funcional_concurrente(genes, organismos, modo_demo=False, usar_cache=True,
+                                            umbral=UMBRAL, max_peticiones=MAX_PETICIONES):
+    """
+    Realiza el análisis funcional para varios organismos a la vez.
+    
+    Cada organismo necesita su propia petición a g:Profiler, así que las
+    peticiones se lanzan en paralelo (como máximo `max_peticiones` a la vez)
+    en lugar de esperar a que termine cada una antes de enviar la siguiente.
+    
+    Parámetros:
+    -----------
+    genes : list o dict
+        Lista de identificadores de genes, o diccionario {nombre: lista}
+    organismos : list
+        Códigos de los organismos a analizar
+    modo_demo : bool, opcional
+        Si es True, usa resultados de demostración sin conexión a internet
+    usar_cache : bool, opcional
+        Si es False, ignora las respuestas guardadas en disco y consulta la API
+    umbral : float, opcional
+        P-valor corregido (FDR) por debajo del cual un término es significativo
+    max_peticiones : int, opcional
+        Número máximo de peticiones simultáneas
+    
+    Retorna:
+    --------
+    dict
+        Diccionario {organismo: resultados}, con los resultados en el mismo
+        formato que devuelve realizar_analisis_funcional
+    """
+    if modo_demo or not TIENE_LIBRERIAS or len(organismos) == 1:
+        return {organismo: realizar_analisis_funcional(genes, organismo, modo_demo, usar_cache, umbral)
+                for organismo in organismos}
+    
+    _mostrar_cabecera(genes, ', '.join(organismos))
+    
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=min(max_peticiones, len(organismos))) as executor:
+        futuros = {organismo: executor.submit(_analizar_organismo, genes, organismo, usar_cache, umbral)
+                   for organismo in organismos}
+        for organismo, futuro in futuros.items():
+            try:
+                resultados[organismo] = futuro.result()
+            except Exception as e:
+                print(f"\n⚠ Error al conectar con g:Profiler ({organismo}): {e}")
+                print("  Usando resultados precargados para este organismo")
+                resultados[organismo] = _resultados_demo(genes, umbral)
+    
+    print(f"\n✓ Análisis completado exitosamente")
+    for organismo, resultados_organismo in resultados.items():
+        print(f"  {organismo}: {_contar_terminos(resultados_organismo)} términos enriquecidos significativamente")
+    
+    return resultados
 
 def guardar_resultados(resultados, archivo_salida):
     """
     Guarda los resultados del análisis en un archivo TSV.
+    La lista recibida queda ordenada por p-valor (se ordena en el sitio).
     
     Parámetros:
     -----------
     resultados : list
-        Lista de diccionarios con los resultados
+        Lista de diccionarios con los resultados, tal como los devuelve
+        realizar_analisis_funcional ('intersections' ya convertido a texto)
     archivo_salida : str
         Ruta del archivo de salida
     """
@@ -284,23 +647,21 @@ def guardar_resultados(resultados, archivo_salida):
         return
     
     try:
-        # Ordenar por p-valor
-        resultados_ordenados = sorted(resultados, key=lambda x: x.get('p_value', 1))
+        # Ordenar por p-valor, sin crear una copia de la lista
+        resultados.sort(key=itemgetter('p_value'))
+        
+        # Construir todo el archivo en memoria y escribirlo de una vez.
+        # Los campos (IDs, nombres de términos, genes) no contienen tabuladores
+        # ni saltos de línea, así que no hace falta entrecomillarlos
+        lineas = ['\t'.join(COLUMNAS)]
+        lineas.extend(
+            '\t'.join([str(resultado.get(columna, '')) for columna in COLUMNAS])
+            for resultado in resultados
+        )
         
+        # Se mantiene el fin de línea \r\n que generaba el módulo csv
         with open(archivo_salida, 'w', newline='', encoding='utf-8') as f:
-            # Definir las columnas que queremos guardar
-            fieldnames = ['source', 'native', 'name', 'p_value', 'significant',
-                         'intersection_size', 'term_size', 'query_size', 'intersections']
-            
-            writer = csv.DictWriter(f, fieldnames=fieldnames, delimiter='\t', extrasaction='ignore')
-            writer.writeheader()
-            
-            for resultado in resultados_ordenados:
-                # Convertir la lista de genes a string
-                resultado_copy = resultado.copy()
-                if isinstance(resultado_copy.get('intersections'), list):
-                    resultado_copy['intersections'] = ', '.join(resultado_copy['intersections'])
-                writer.writerow(resultado_copy)
+            f.write('\r\n'.join(lineas) + '\r\n')
         
         print(f"\n✓ Resultados guardados en: {archivo_salida}")
         
@@ -310,6 +671,31 @@ def guardar_resultados(resultados, archivo_salida):
         traceback.print_exc()
         sys.exit(1)
 
+def _guardar_resultados_demo(genes, archivo_salida, umbral=UMBRAL):
+    """
+    Guarda los resultados de demostración rellenando el TSV precalculado con
+    los genes de la lista, sin construir ni ordenar los diccionarios.
+    
+    Retorna False, sin escribir nada, si la plantilla no sirve para el caso:
+    listas de menos de tres genes o un umbral que descarta algún término.
+    """
+    if len(genes) < 3 or umbral <= _P_MAX_DEMO:
+        return False
+    
+    try:
+        contenido = _TSV_DEMO.format(todos=', '.join(genes), g0=genes[0], g1=genes[1], g2=genes[2])
+        with open(archivo_salida, 'w', newline='', encoding='utf-8') as f:
+            f.write(contenido)
+        
+        print(f"\n✓ Resultados guardados en: {archivo_salida}")
+        return True
+        
+    except Exception as e:
+        print(f"\nError al guardar resultados: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
 def mostrar_resumen(resultados):
     """
     Muestra un resumen de los resultados más relevantes.
@@ -317,47 +703,49 @@ def mostrar_resumen(resultados):
     Parámetros:
     -----------
     resultados : list
-        Lista de diccionarios con los resultados
+        Lista de diccionarios con los resultados, tal como los devuelve
+        realizar_analisis_funcional ('intersections' ya convertido a texto)
     """
     if not resultados:
         print("\nNo hay resultados para mostrar.")
         return
     
-    print("\n" + "="*70)
-    print("RESUMEN DE RESULTADOS")
-    print("="*70)
+    # El resumen se acumula y se escribe de una sola vez al final
+    partes = ["\n" + "="*70, "RESUMEN DE RESULTADOS", "="*70]
     
     # Contar por fuente de datos
-    fuentes = {}
-    for resultado in resultados:
-        fuente = resultado.get('source', 'Unknown')
-        fuentes[fuente] = fuentes.get(fuente, 0) + 1
+    fuentes = Counter(resultado.get('source', 'Unknown') for resultado in resultados)
     
-    print("\n📊 Términos significativos por base de datos:")
+    partes.append("\n📊 Términos significativos por base de datos:")
     for fuente in sorted(fuentes.keys()):
-        print(f"  - {fuente}: {fuentes[fuente]} términos")
+        partes.append(f"  - {fuente}: {fuentes[fuente]} términos")
     
-    # Ordenar por p-valor
-    resultados_ordenados = sorted(resultados, key=lambda x: x.get('p_value', 1))
+    # Top 10 términos más significativos (selección parcial, sin ordenar toda la lista)
+    partes.append("\n🔝 Top 10 términos más significativamente enriquecidos:")
+    partes.append("-" * 70)
     
-    # Top 10 términos más significativos
-    print("\n🔝 Top 10 términos más significativamente enriquecidos:")
-    print("-" * 70)
+    for idx, row in enumerate(nsmallest(10, resultados, key=itemgetter('p_value')), 1):
+        partes.extend([
+            f"\n{idx}. {row.get('name', 'N/A')}",
+            f"   Base de datos: {row.get('source', 'N/A')}",
+            f"   ID: {row.get('native', 'N/A')}",
+            f"   P-valor: {row.get('p_value', 0):.2e}",
+            f"   Genes en término: {row.get('intersection_size', 0)}/{row.get('term_size', 0)}",
+            f"   Genes: {row.get('intersections', '')}"
+        ])
     
-    for idx, row in enumerate(resultados_ordenados[:10], 1):
-        print(f"\n{idx}. {row.get('name', 'N/A')}")
-        print(f"   Base de datos: {row.get('source', 'N/A')}")
-        print(f"   ID: {row.get('native', 'N/A')}")
-        print(f"   P-valor: {row.get('p_value', 0):.2e}")
-        print(f"   Genes en término: {row.get('intersection_size', 0)}/{row.get('term_size', 0)}")
-        
-        # Manejar intersections que puede ser lista o string
-        intersections = row.get('intersections', [])
-        if isinstance(intersections, list):
-            genes_str = ', '.join(intersections)
-        else:
-            genes_str = str(intersections)
-        print(f"   Genes: {genes_str}")
+    _escribir(partes)
+
+def _ruta_salida(archivo_salida, *etiquetas):
+    """
+    Añade las etiquetas al nombre del archivo de salida, antes de la extensión.
+    Sin etiquetas se devuelve la ruta sin modificar.
+    """
+    etiquetas = [etiqueta for etiqueta in etiquetas if etiqueta]
+    if not etiquetas:
+        return archivo_salida
+    base, extension = os.path.splitext(archivo_salida)
+    return f"{base}_{'_'.join(etiquetas)}{extension}"
 
 def main():
     """
@@ -372,6 +760,12 @@ Ejemplos de uso:
   python analisis_funcional.py -i ..\\data\\genes_input.txt -o ..\\results\\resultados.tsv
   python analisis_funcional.py -i genes.txt -o resultados.tsv --demo
   python analisis_funcional.py -i genes.txt -o resultados.tsv --organismo mmusculus
+  python analisis_funcional.py -i genes.txt -o resultados.tsv --organismo hsapiens mmusculus
+
+Varias listas en un mismo archivo (una por línea, se analizan en una sola petición):
+  mitocondria: COX4I2, ND1, ATP6
+  glucolisis: HK1, PFKM, PKM
+  -> resultados_mitocondria.tsv, resultados_glucolisis.tsv
 
 Organismos soportados:
   hsapiens (humano), mmusculus (ratón), rnorvegicus (rata),
@@ -382,7 +776,8 @@ Organismos soportados:
     parser.add_argument(
         '-i', '--input',
         required=True,
-        help='Archivo de entrada con genes (uno por línea o separados por comas)'
+        help='Archivo de entrada con genes (uno por línea, separados por comas '
+             'o varias listas con formato "nombre: GEN1, GEN2")'
     )
     
     parser.add_argument(
@@ -393,8 +788,10 @@ Organismos soportados:
     
     parser.add_argument(
         '--organismo',
-        default='hsapiens',
-        help='Código del organismo (por defecto: hsapiens)'
+        nargs='+',
+        default=['hsapiens'],
+        help='Código del organismo (por defecto: hsapiens). Con varios organismos '
+             'las peticiones se envían en paralelo'
     )
     
     parser.add_argument(
@@ -403,30 +800,62 @@ Organismos soportados:
         help='Usar modo demostración con resultados precargados (sin conexión a internet)'
     )
     
+    parser.add_argument(
+        '--umbral',
+        type=float,
+        default=UMBRAL,
+        help=f'P-valor corregido (FDR) máximo para considerar un término significativo '
+             f'(por defecto: {UMBRAL}). Cambiarlo no requiere volver a consultar la API'
+    )
+    
+    parser.add_argument(
+        '--sin-cache',
+        action='store_true',
+        help=f'Ignorar las respuestas guardadas en {DIRECTORIO_CACHE} y consultar la API'
+    )
+    
     # Parsear argumentos
     args = parser.parse_args()
     
     # Banner inicial
-    print("\n" + "="*70)
-    print(" "*15 + "ANÁLISIS FUNCIONAL DE GENES")
-    print(" "*20 + "usando g:Profiler API")
-    print("="*70)
+    _escribir(["\n" + "="*70,
+               " "*15 + "ANÁLISIS FUNCIONAL DE GENES",
+               " "*20 + "usando g:Profiler API",
+               "="*70])
     
     # Paso 1: Leer genes
     genes = leer_genes(args.input)
     
     # Paso 2: Realizar análisis funcional
-    resultados = realizar_analisis_funcional(genes, args.organismo, modo_demo=args.demo)
+    por_organismo = realizar_analisis_funcional_concurrente(genes, args.organismo, modo_demo=args.demo,
+                                                           usar_cache=not args.sin_cache,
+                                                           umbral=args.umbral)
     
-    # Paso 3: Guardar resultados
-    guardar_resultados(resultados, args.output)
+    # En modo demostración el TSV se escribe directamente desde la plantilla
+    modo_demo = args.demo or not TIENE_LIBRERIAS
     
-    # Paso 4: Mostrar resumen
-    mostrar_resumen(resultados)
+    # Se genera un archivo de salida por organismo (si hay varios) y por lista
+    for organismo, resultados in por_organismo.items():
+        etiqueta_organismo = organismo if len(por_organismo) > 1 else None
+        por_lista = resultados if isinstance(resultados, dict) else {None: resultados}
+        
+        for nombre, resultados_lista in por_lista.items():
+            etiquetas = [etiqueta for etiqueta in (etiqueta_organismo, nombre) if etiqueta]
+            if etiquetas:
+                print(f"\n▶ {' / '.join(etiquetas)}")
+            
+            # Paso 3: Guardar resultados
+            archivo_salida = _ruta_salida(args.output, *etiquetas)
+            genes_lista = genes[nombre] if nombre is not None else genes
+            if not (modo_demo and _guardar_resultados_demo(genes_lista, archivo_salida, args.umbral)):
+                guardar_resultados(resultados_lista, archivo_salida)
+            
+            # Paso 4: Mostrar resumen
+            mostrar_resumen(resultados_lista)
     
-    print("\n" + "="*70)
-    print("✓ ANÁLISIS COMPLETADO EXITOSAMENTE")
-    print("="*70 + "\n")
+    _escribir(["\n" + "="*70,
+               "✓ ANÁLISIS COMPLETADO EXITOSAMENTE",
+               "="*70 + "\n"])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file